@@ -0,0 +1,67 @@
+"""
+Shared logging setup for Walter.
+
+Every module logs through a child of the "Walter" logger (e.g. "Walter.Main",
+"Walter.Walter"). The stdout/stderr handlers are attached once, to the "Walter"
+parent, and child records propagate to them.
+
+Output:
+- stdout: INFO and WARNING.
+- stderr: ERROR and above.
+"""
+
+import logging
+import sys
+
+_ERROR_LEVEL = logging.ERROR
+
+_parent_logger = logging.getLogger("Walter")
+
+
+def _below_error(record, _error_level=_ERROR_LEVEL) -> bool:
+    """Log filter passing records below ERROR; ERROR and above go to stderr."""
+    return record.levelno < _error_level
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Return a logger for one of Walter's modules.
+
+    Parameters:
+        name (str): Logger name; should be a child of "Walter", e.g. "Walter.Main".
+
+    Returns:
+        logging.Logger: The logger, set to DEBUG so the handlers decide what is shown.
+
+    Notes:
+        - No handlers are attached here; call configure_logging() once at startup.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def configure_logging():
+    """
+    Attach the stdout/stderr handlers to the "Walter" parent logger.
+
+    Safe to call more than once; the handlers are only created and attached the
+    first time.
+    """
+    if _parent_logger.handlers:
+        return
+
+    # systemd already tracks date and time so the redundancy is unnecessary
+    logger_formatter = logging.Formatter("[%(levelname)s] %(name)s: %(message)s")
+
+    handler_info = logging.StreamHandler(sys.stdout)
+    handler_info.setLevel(logging.INFO)
+    handler_info.addFilter(_below_error)  # keep stdout to < ERROR
+    handler_info.setFormatter(logger_formatter)
+
+    handler_error = logging.StreamHandler(sys.stderr)
+    handler_error.setLevel(logging.ERROR)
+    handler_error.setFormatter(logger_formatter)
+
+    _parent_logger.addHandler(handler_info)
+    _parent_logger.addHandler(handler_error)
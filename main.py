@@ -29,32 +29,53 @@ Configuration file:
 ▐▙▄▄▖ ▝▚▞▘ ▗▄▄▞▘▐▌   ▐▌ ▐▌▐▙▄▄▖▗▄▄▞▘▗▄▄▞▘▝▚▄▞▘
 """
 
-import logging
+import asyncio
+import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from os import environ
-import discord
-from discord import app_commands
-import yaml
+from functools import lru_cache
+from os import environ, environb, remove, replace, stat
+from log_setup import configure_logging, get_logger
 from walter import Walter, WalterStatus
 
-logger = logging.getLogger("Walter.Main")
-logger.setLevel(logging.DEBUG)
-
-# systemd already tracks date and time so the redundancy is unnecessary
-logger_formatter = logging.Formatter("[%(levelname)s] %(name)s: %(message)s")
-
-handler_info = logging.StreamHandler(sys.stdout)
-handler_info.setLevel(logging.INFO)
-handler_info.addFilter(lambda r: r.levelno < logging.ERROR)  # keep stdout to < ERROR
-handler_info.setFormatter(logger_formatter)
-
-handler_error = logging.StreamHandler(sys.stderr)
-handler_error.setLevel(logging.ERROR)
-handler_error.setFormatter(logger_formatter)
-
-logger.addHandler(handler_info)
-logger.addHandler(handler_error)
+# orjson is optional; the stdlib parser also accepts bytes
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+logger = get_logger("Walter.Main")
+
+# Replies to /whitelist; RESP_SUCCESS_TMPL takes the Minecraft username as {name}
+RESP_ALREADY_USED = (
+    ":red_square: :orange_book: :red_square:\nOops, det virker som om du allerede har brukt din whitelist token! Vennligst ta kontakt med en @server_admin om du mener det har oppstått en feil, eller om du vil whiteliste noen andre."
+)
+RESP_ALREADY_WHITELISTED = (
+    ":yellow_square::grey_question::yellow_square:\n Oops, det virker som om du allerede har blitt whitelistet på serveren.\nVennligst ta kontakt med en @server_admin om du mener det har oppstått en feil"
+)
+RESP_MINECRAFT_USER_NOT_VALID = (
+    ":red_square: :grey_question: :red_square:\nOops, det virker som om det Minecraft-brukernavnet ikke finnes! Vennligst sjekk at du har skrevet det riktig og prøv igjen."
+)
+RESP_ERROR = (
+    ":red_square: :warning: :red_square:\nOops, noe gikk galt! Vennligst prøv igjen senere, eller ta kontakt med en @server_admin om feilen vedvarer."
+)
+RESP_SUCCESS_TMPL = (
+    ":green_circle: :book: :green_circle:\n{name} har blitt lagt til whitelisten! Good luck, have fun!"
+)
+
+# WalterStatus.OK has no entry and gets _format_success()
+_RESPONSES = {
+    WalterStatus.DISCORD_ALREADY_USED: RESP_ALREADY_USED,
+    WalterStatus.ALREADY_WHITELISTED: RESP_ALREADY_WHITELISTED,
+    WalterStatus.MINECRAFT_USER_NOT_VALID: RESP_MINECRAFT_USER_NOT_VALID,
+}
+
+
+@lru_cache(maxsize=128)
+def _format_success(minecraft_username: str) -> str:
+    """Format RESP_SUCCESS_TMPL, memoized for repeated usernames."""
+    return RESP_SUCCESS_TMPL.format(name=minecraft_username)
 
 
 @dataclass
@@ -65,11 +86,77 @@ class WalterConfig:
     rcon_secret: str
 
 
+def _read_config_file() -> object:
+    """
+    Read config.yaml, preferring its JSON cache when the cache is up to date.
+
+    The cache (config.yaml.cache) records the st_mtime_ns and st_size of the
+    config.yaml it was built from, and is only used when both match exactly. A
+    newer-or-equal check is not enough: restoring a backup, cp -p or rsync -a can
+    put an older file in place. Otherwise, or if the cache cannot be read,
+    config.yaml is parsed and the cache is rewritten.
+
+    Returns:
+        object: The parsed document; validation is left to the caller.
+
+    Raises:
+        IOError: If config.yaml cannot be read.
+        ValueError: If config.yaml contains malformed YAML.
+
+    Notes:
+        - The cache is read with orjson when it is installed.
+        - PyYAML is only imported on a cache miss, so warm starts skip both its
+          import and the parse.
+        - The cache is replaced atomically; failing to write it is logged as a
+          warning, the partial temp file is removed, and startup continues.
+    """
+    source_stat = stat("config.yaml")
+    source = {"mtime_ns": source_stat.st_mtime_ns, "size": source_stat.st_size}
+    try:
+        with open("config.yaml.cache", "rb") as file:
+            cache = _json_loads(file.read())
+        if isinstance(cache, dict) and cache.get("source") == source:
+            return cache["config"]
+    except (KeyError, ValueError, IOError):
+        pass  # Missing, corrupt or old-format cache; fall through and rebuild it
+
+    import yaml
+
+    # Prefer the libyaml-backed loader; fall back to the pure-Python one if
+    # PyYAML was built without libyaml
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader
+
+    try:
+        with open("config.yaml", "r", encoding="utf-8") as file:
+            config_yaml = yaml.load(file, Loader=Loader)
+    except yaml.YAMLError as e:
+        raise ValueError(e) from e
+
+    # Write to a temporary file and swap it in, so a crash or a failed dump
+    # never leaves a truncated cache behind
+    try:
+        with open("config.yaml.cache.tmp", "w", encoding="utf-8") as file:
+            json.dump({"source": source, "config": config_yaml}, file)
+        replace("config.yaml.cache.tmp", "config.yaml.cache")
+    except (TypeError, ValueError, IOError) as e:
+        logger.warning("Could not write config.yaml.cache: %s", e)
+        try:
+            remove("config.yaml.cache.tmp")
+        except OSError:
+            pass  # Never created, or already gone
+
+    return config_yaml
+
+
 def load_config() -> WalterConfig:
     """
     Load and validate configuration from config.yaml and environment variables.
 
-    Reads config.yaml for database paths and guild ID.
+    Reads config.yaml (via its JSON cache when up to date) for database paths
+    and guild ID.
     Reads environment variables for secrets.
 
     Returns:
@@ -85,20 +172,19 @@ def load_config() -> WalterConfig:
         - Requires 'paths.discord_database' and 'guild_id' in config.yaml.
         - Requires 'WALTER_DISCORD_KEY' and 'WALTER_RCON_SECRET' in environment.
     """
-    # Load YAML
+    # Load YAML (or its cache)
     try:
-        with open("config.yaml", "r", encoding="utf-8") as file:
-            config_yaml = yaml.safe_load(file)
-            if not isinstance(config_yaml, dict):
-                logger.error("Config root must be a dictionary")
-                sys.exit(1)
-    except (yaml.YAMLError, IOError) as e:
-        logger.error(f"Could not load config.yaml: {e}")
+        config_yaml = _read_config_file()
+    except (ValueError, IOError) as e:
+        logger.error("Could not load config.yaml: %s", e)
         sys.exit(1)
 
     # Extract and validate values
-    paths = config_yaml.get("paths", {})
-    discord_database_path = paths.get("discord_database")
+    if not isinstance(config_yaml, dict):
+        logger.error("Config root must be a dictionary")
+        sys.exit(1)
+
+    discord_database_path = (config_yaml.get("paths") or {}).get("discord_database")
     if not discord_database_path:
         logger.error("Missing 'paths.discord_database' in config.yaml")
         sys.exit(1)
@@ -110,14 +196,22 @@ def load_config() -> WalterConfig:
     
     try:
         guild_id = int(raw_guild_id)
-    except ValueError:
+    except (TypeError, ValueError):
         logger.error("Invalid 'guild_id' in config.yaml; must be an integer")
         sys.exit(1)
 
-    token = environ.get("WALTER_DISCORD_KEY")
+    # Read the token as bytes to skip os.environ's filesystem-encoding decode;
+    # Discord tokens are plain ASCII
+    token = environb.get(b"WALTER_DISCORD_KEY")
     if not token:
         logger.error("Couldn't get Discord API token from env vars (WALTER_DISCORD_KEY)")
         sys.exit(1)
+    try:
+        token = token.decode("ascii")
+    except UnicodeDecodeError:
+        # A mangled token would only fail later, at login, with a less clear error
+        logger.error("Discord API token in WALTER_DISCORD_KEY is not ASCII")
+        sys.exit(1)
 
     rcon_secret = environ.get("WALTER_RCON_SECRET")
     if not rcon_secret:
@@ -137,11 +231,11 @@ def main():
     Entrypoint for the Walter Discord bot.
 
     Workflow:
-    1. Load configuration via load_config().
+    1. Configure logging and load configuration via load_config().
     2. Initialize the Discord client and the application command tree.
     3. Instantiate the Walter backend with configured paths and secrets.
     4. Register the /whitelist command and the on_ready event handler.
-    5. Run the Discord client.
+    5. Run the Discord client, then write any buffered token rows on exit.
 
     Side Effects:
         - Logs startup and error messages.
@@ -149,18 +243,33 @@ def main():
         - Sets the bot presence to guide users to use /whitelist.
         - Exits the process with status 1 if configuration is invalid.
     """
+    configure_logging()
     config = load_config()
 
-    intents = discord.Intents.default()
+    # Imported only once the config is valid so config errors exit without
+    # loading discord.py
+    import discord
+    from discord import app_commands
+
+    # Slash commands arrive as interactions regardless of intents; only the
+    # guild cache is needed, so skip message, reaction, typing etc. events
+    intents = discord.Intents.none()
+    intents.guilds = True
     client = discord.Client(intents=intents)
     tree = app_commands.CommandTree(client)
 
     walter = Walter(config.discord_database_path, config.rcon_secret)
+    guild = discord.Object(id=config.guild_id)
+    # Bounds concurrent backend calls (and so Mojang requests) to what the
+    # HTTP connection pool keeps warm
+    backend_pool = ThreadPoolExecutor(
+        max_workers=Walter.MAX_CONCURRENT_REQUESTS, thread_name_prefix="walter"
+    )
 
     @tree.command(
         name="whitelist",
         description="Add yourself to the minecraft server whitelist",
-        guild=discord.Object(id=config.guild_id),
+        guild=guild,
     )
     async def whitelist(interaction, minecraft_username: str):
         """
@@ -171,31 +280,50 @@ def main():
             minecraft_username (str): The Minecraft username to whitelist.
 
         Behavior:
-            - Resolves the invoking Discord user name.
-            - Delegates to Walter.add_to_whitelist(discord_username, minecraft_username).
+            - Resolves the invoking Discord user's ID and name.
+            - Defers the interaction, then runs
+              Walter.add_to_whitelist(user_id, discord_username, minecraft_username)
+              on the backend thread pool so the event loop is not blocked.
             - Sends a localized response based on the returned status:
               - WalterStatus.DISCORD_ALREADY_USED: User has already consumed their whitelist token.
               - WalterStatus.ALREADY_WHITELISTED: User is already whitelisted.
+              - WalterStatus.MINECRAFT_USER_NOT_VALID: The username doesn't exist or
+                couldn't be validated.
               - Otherwise: Success response indicating whitelist update may take ~30 seconds.
+            - If the backend raises, logs the error and sends a generic error response.
 
         Responses:
-            Sends one message to the invoking user describing the outcome.
+            Sends one follow-up message to the invoking user describing the outcome.
         """
-        discord_username = str(interaction.user)
-        status_code = walter.add_to_whitelist(discord_username, minecraft_username)
-
-        if status_code == WalterStatus.DISCORD_ALREADY_USED:
-            await interaction.response.send_message(
-                ":red_square: :orange_book: :red_square:\nOops, det virker som om du allerede har brukt din whitelist token! Vennligst ta kontakt med en @server_admin om du mener det har oppstått en feil, eller om du vil whiteliste noen andre."
-            )
-        elif status_code == WalterStatus.ALREADY_WHITELISTED:
-            await interaction.response.send_message(
-                ":yellow_square::grey_question::yellow_square:\n Oops, det virker som om du allerede har blitt whitelistet på serveren.\nVennligst ta kontakt med en @server_admin om du mener det har oppstått en feil"
-            )
+        # Equivalent to str(interaction.user); accounts migrated to the new
+        # username system have the discriminator "0" and no suffix
+        user = interaction.user
+        if user.discriminator == "0":
+            discord_username = user.name
         else:
-            await interaction.response.send_message(
-                f":green_circle: :book: :green_circle:\n{minecraft_username} har blitt lagt til whitelisten! Good luck, have fun!"
+            discord_username = f"{user.name}#{user.discriminator}"
+
+        # Acknowledge within Discord's 3 second window, then run the blocking
+        # backend off the event loop
+        await interaction.response.defer(thinking=True)
+        try:
+            status_code = await asyncio.get_running_loop().run_in_executor(
+                backend_pool,
+                walter.add_to_whitelist,
+                user.id,
+                discord_username,
+                minecraft_username,
+            )
+        except Exception as e:
+            # Always answer the deferred interaction, or "thinking..." stays up
+            logger.error(
+                "Error whitelisting %s for %s: %s", minecraft_username, discord_username, e
             )
+            await interaction.followup.send(RESP_ERROR)
+            return
+
+        response = _RESPONSES.get(status_code) or _format_success(minecraft_username)
+        await interaction.followup.send(response)
 
     @client.event
     async def on_ready():
@@ -211,7 +339,7 @@ def main():
             Ensures the slash command is registered and users see a helpful status
             indicating how to invoke the whitelist command.
         """
-        await tree.sync(guild=discord.Object(id=config.guild_id))
+        await tree.sync(guild=guild)
 
         # Courtesy of https://stackoverflow.com/a/70644609
         await client.change_presence(
@@ -224,7 +352,11 @@ def main():
 
         logger.info("Good morning, Walter is fully awake!")
 
-    client.run(config.discord_token)
+    try:
+        client.run(config.discord_token)
+    finally:
+        # Buffered token rows are written by a daemon timer; don't drop them
+        walter.flush()
 
 
 if __name__ == "__main__":
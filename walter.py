@@ -1,11 +1,10 @@
-from datetime import datetime
-import logging
-import sys
+import re
 import signal
 from enum import Enum
 import sqlite3
-import requests
-from mcrcon import MCRcon
+import threading
+import time
+from log_setup import get_logger
 
 """
 Walter backend for managing Minecraft whitelisting.
@@ -16,30 +15,19 @@ This module encapsulates the logic for:
 - Interacting with a local Minecraft server via RCON to add players to the whitelist.
 
 Logging:
-- INFO: Operational messages (database loaded, RCON responses).
+- DEBUG: RCON responses.
+- INFO: Operational messages (database loaded, users recorded).
 - ERROR: Failures (I/O errors, network validation errors).
 
 Signals:
 - SIGINT, SIGTERM: Trigger clean RCON disconnect, database connection closure, and process exit.
 """
 
-logger = logging.getLogger("Walter.Walter")
-logger.setLevel(logging.DEBUG)
+logger = get_logger("Walter.Walter")
 
-# systemd already tracks date and time so the redundancy is unnecessary
-logger_formatter = logging.Formatter("[%(levelname)s] %(name)s: %(message)s")
-
-handler_info = logging.StreamHandler(sys.stdout)
-handler_info.setLevel(logging.INFO)
-handler_info.addFilter(lambda r: r.levelno < logging.ERROR)  # keep stdout to < ERROR
-handler_info.setFormatter(logger_formatter)
-
-handler_error = logging.StreamHandler(sys.stderr)
-handler_error.setLevel(logging.ERROR)
-handler_error.setFormatter(logger_formatter)
-
-logger.addHandler(handler_info)
-logger.addHandler(handler_error)
+# Characters and length Mojang allows in a Minecraft username. The lower bound
+# is 1 rather than 3 because some legacy accounts predate the 3 character minimum
+_MINECRAFT_USERNAME_RE = re.compile(r"[A-Za-z0-9_]{1,16}")
 
 
 class WalterStatus(Enum):
@@ -60,6 +48,81 @@ class WalterStatus(Enum):
     MINECRAFT_USER_NOT_VALID = 3
 
 
+class _RconCommandNotSent(ConnectionError):
+    """An RCON command never reached the server, so it is safe to send it again."""
+
+
+def _make_rcon_client(host: str, password: str):
+    """
+    Create an MCRcon client that can be used from worker threads.
+
+    mcrcon enforces its read timeout with signal.alarm(), but Python only runs
+    signal handlers in the main thread. Called from a worker thread, the timeout
+    fires in the main thread instead, and the read itself spins forever on the
+    empty recv() of a connection the server has closed.
+
+    The returned client never arms SIGALRM. Reads use a socket timeout instead,
+    and an empty recv() raises ConnectionError.
+
+    command() also tells apart failures where the server may have run the command
+    from those where it provably did not:
+        - _RconCommandNotSent: The connection was already closed (the server hung
+          up since the last reply, or the client is disconnected) or the send
+          itself failed. The command never ran.
+        - Any other OSError (EOF, reset, socket.timeout): The command was sent and
+          may have run. The client disconnects, so a late reply is never read as
+          the answer to the next command.
+
+    Parameters:
+        host (str): Address of the Minecraft server.
+        password (str): RCON password.
+
+    Returns:
+        MCRcon: The client, not yet connected.
+
+    Notes:
+        - mcrcon (and the ssl, argparse etc. it imports) is only loaded here, so
+          importing walter doesn't pay for it.
+    """
+    import select
+    from mcrcon import MCRcon
+
+    class _RconClient(MCRcon):
+        def command(self, command: str) -> str:
+            if self.socket is None or self._is_stale():
+                raise _RconCommandNotSent("RCON connection closed")
+            self._sent = False
+            try:
+                return super().command(command)
+            except OSError as e:
+                if not self._sent:
+                    raise _RconCommandNotSent(e) from e
+                self.disconnect()
+                raise
+
+        def _is_stale(self) -> bool:
+            # Between commands nothing should be readable; EOF or unsolicited
+            # data means the connection can't be used
+            try:
+                return bool(select.select([self.socket], [], [], 0)[0])
+            except (OSError, ValueError):
+                return True
+
+        def _read(self, length: int) -> bytes:
+            # Only called once the request has been sent
+            self._sent = True
+            self.socket.settimeout(self.timeout)
+            data = b""
+            while len(data) < length:
+                chunk = self.socket.recv(length - len(data))
+                if not chunk:
+                    raise ConnectionError("RCON connection closed by the server")
+                data += chunk
+            return data
+
+    return _RconClient(host, password)
+
+
 class Walter:
     """
     Backend service for managing Minecraft server whitelisting.
@@ -76,42 +139,162 @@ class Walter:
         rcon_secret (str): RCON password used to authenticate to the local server.
 
     Notes:
-        - RCON is initialized against 127.0.0.1 using the provided secret.
+        - RCON is initialized against 127.0.0.1 using the provided secret, through
+          a client that does not rely on SIGALRM (see _make_rcon_client()).
+        - Mojang lookups share one pooled HTTP session (keep-alive).
         - The database is connected at initialization.
+        - add_to_whitelist() is safe to call from worker threads; database and RCON
+          access is serialized by an internal lock.
         - Signal handlers are registered for SIGINT and SIGTERM for graceful shutdown.
     """
 
+    # Seconds to buffer database inserts before writing them in one transaction
+    FLUSH_INTERVAL = 0.5
+    # Retries for a flush that hit a locked/busy database; the delay doubles each time
+    FLUSH_MAX_RETRIES = 5
+
+    # Bounds for the per-username cache of definitive Mojang answers
+    MOJANG_CACHE_SIZE = 256
+    MOJANG_CACHE_TTL = 300  # seconds
+
+    # Worker threads callers should use for add_to_whitelist(); the HTTP
+    # connection pool is sized to match so each can keep a warm connection
+    MAX_CONCURRENT_REQUESTS = 8
+
+    # Seconds shutdown waits for an in-flight request to release the lock
+    SHUTDOWN_LOCK_TIMEOUT = 5
+
     def __init__(
         self,
         path_to_discord_database: str,
         rcon_secret: str,
     ):
-        self.rcon_socket = MCRcon("127.0.0.1", rcon_secret)
+        # Imported here rather than at module level so importing walter (e.g. from
+        # main.py before the config is validated) doesn't load them
+        import requests
+        from mcrcon import MCRconException
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # Kept for except clauses, which can't name the lazily imported modules
+        self._request_exception = requests.RequestException
+        self._rcon_exception = MCRconException
+
+        self.rcon_socket = _make_rcon_client("127.0.0.1", rcon_secret)
         self.rcon_socket.connect()
 
-        self._discord_database_connection = sqlite3.connect(path_to_discord_database)
-        self._discord_database_cursor = self._discord_database_connection.cursor()
+        # Requests are served from worker threads; self._lock serializes access
+        self._lock = threading.Lock()
+        # Set under the lock by _signal_close(); workers stop touching RCON/database
+        self._closing = False
+        # Autocommit mode; multi-statement writes open their own BEGIN/COMMIT.
+        # Statements go through connection.execute() and its statement cache
+        self._discord_database_connection = sqlite3.connect(
+            path_to_discord_database, check_same_thread=False, isolation_level=None
+        )
+        # WAL + synchronous=NORMAL: one WAL append per commit instead of several
+        # fsyncs of the rollback journal, and still safe against process crashes
+        self._discord_database_connection.execute("PRAGMA journal_mode=WAL")
+        self._discord_database_connection.execute("PRAGMA synchronous=NORMAL")
+        self._discord_database_connection.execute("PRAGMA temp_store=MEMORY")
         logger.info("Connected to Discord database")
 
-        result = self._discord_database_cursor.execute("SELECT * FROM sqlite_master")
-        if result.fetchone() is None:
-            logger.info("Discord username database was empty; Creating new table")
-            self._discord_database_cursor.execute(
-                "CREATE TABLE users(username, tokens, created)"
-            )
-            logger.info("Create Table OK")
+        self.__prepare_discord_database()
+
+        # Inserts are buffered and written in one transaction per flush window
+        self._pending_users = []
+        self._flush_timer = None
+        self._flush_retries = 0
+
+        # One pooled session so Mojang lookups reuse the TCP/TLS connection
+        self._http = requests.Session()
+        self._http.headers.update({"User-Agent": "walter-bot"})
+        # Retry once on transient gateway errors instead of failing the request
+        retry = Retry(
+            total=1,
+            backoff_factor=0.2,
+            status_forcelist={502, 503, 504},
+            allowed_methods={"GET", "HEAD"},
+        )
+        self._http.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=self.MAX_CONCURRENT_REQUESTS,
+                max_retries=retry,
+            ),
+        )
+
+        # Lowercased username -> (is_valid, time.monotonic() when stored), oldest first.
+        # Validation runs outside self._lock, so the cache has its own lock
+        self._mojang_cache = {}
+        self._mojang_cache_lock = threading.Lock()
 
         for sig in (signal.SIGINT, signal.SIGTERM):
             signal.signal(sig, self._signal_close)
 
+    def __prepare_discord_database(self):
+        """
+        Create or migrate the Discord database and load used tokens into memory.
+
+        Schema:
+            users(user_id INTEGER PRIMARY KEY, tokens INTEGER, created TEXT)
+            'created' defaults to the local insert time in ISO 8601 format.
+            Keyed on the Discord user ID, which unlike the username never changes,
+            and which SQLite stores as the rowid.
+
+        Migration:
+            - A 'users' table from older versions, keyed on the Discord username, is
+              renamed to 'legacy_users' and a fresh 'users' table is created.
+            - Usernames in 'legacy_users' keep counting as used tokens.
+
+        Side Effects:
+            - Loads the used user IDs and legacy usernames into in-memory sets, which
+              answer the per-request token check without a query. The database
+              stays the source of truth.
+        """
+        connection = self._discord_database_connection
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(users)")}
+
+        connection.execute("BEGIN")
+        if "username" in columns:
+            logger.info("Moving username-keyed users table to legacy_users")
+            connection.execute("ALTER TABLE users RENAME TO legacy_users")
+            columns = set()
+
+        if not columns:
+            logger.info("Discord users table missing; Creating new table")
+            connection.execute(
+                "CREATE TABLE users("
+                "user_id INTEGER PRIMARY KEY, "
+                "tokens INTEGER, "
+                "created TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'))"
+                ")"
+            )
+            logger.info("Create Table OK")
+        connection.execute("COMMIT")
+
+        self._used_discord_user_ids = {
+            row[0] for row in connection.execute("SELECT user_id FROM users")
+        }
+
+        has_legacy_table = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='legacy_users'"
+        ).fetchone() is not None
+        self._legacy_used_discord_usernames = (
+            {row[0] for row in connection.execute("SELECT username FROM legacy_users")}
+            if has_legacy_table
+            else set()
+        )
+
     def _signal_close(self, signum, frame):
         """
         Signal handler to gracefully disconnect RCON, close the database, and exit.
 
         Actions:
             - Logs the received signal.
-            - Disconnects the RCON socket.
-            - Closes the SQLite database connection.
+            - Flushes buffered database inserts and closes the SQLite connection.
+            - Disconnects the RCON socket and closes the HTTP session.
             - Restores default handling for the received signal.
             - Raises KeyboardInterrupt on SIGINT or SystemExit on SIGTERM to exit.
 
@@ -122,13 +305,48 @@ class Walter:
         Side Effects:
             - Disconnects RCON and closes the database connection.
             - Terminates the process via exception to allow upstream handling.
+
+        Notes:
+            - The database is handled first so buffered tokens are saved even if
+              RCON is already gone. Errors during cleanup are logged, and the
+              process exits regardless.
+            - Waits at most SHUTDOWN_LOCK_TIMEOUT seconds for an in-flight request
+              to release the lock. If it doesn't, the database and RCON are left to
+              that request rather than closed under it, and the buffered users are
+              logged as not saved.
+            - Sets self._closing so in-flight and later requests stop before
+              touching RCON or the database.
         """
         logger.info("Received signal %s; closing RCON and exiting.", signum)
-        self.rcon_socket.disconnect()
-        self._discord_database_connection.commit()
-        self._discord_database_connection.close()
-        signal.signal(signum, signal.SIG_DFL)
-        raise KeyboardInterrupt if signum == signal.SIGINT else SystemExit
+        locked = self._lock.acquire(timeout=self.SHUTDOWN_LOCK_TIMEOUT)
+        try:
+            self._closing = True
+            flush_timer = self._flush_timer
+            if flush_timer is not None:
+                flush_timer.cancel()
+            if locked:
+                self.__flush_pending_users(retry=False)
+                self._discord_database_connection.close()
+                self.rcon_socket.disconnect()
+            else:
+                logger.error(
+                    "Timed out waiting for in-flight requests; "
+                    "exiting without closing the database and RCON"
+                )
+                pending_users = list(self._pending_users)
+                if pending_users:
+                    logger.error(
+                        "Could not save %s to database before exiting",
+                        ", ".join(str(row[0]) for row in pending_users),
+                    )
+            self._http.close()
+        except Exception as e:
+            logger.error("Error during shutdown: %s", e)
+        finally:
+            if locked:
+                self._lock.release()
+            signal.signal(signum, signal.SIG_DFL)
+            raise KeyboardInterrupt if signum == signal.SIGINT else SystemExit
 
     def __check_minecraft_user_is_valid(self, username: str) -> bool:
         """
@@ -149,19 +367,54 @@ class Walter:
             - ERROR on request exceptions with details.
 
         Timeout:
-            - 5.0 seconds per request.
+            - 2.0 seconds to connect and 3.0 seconds to read, per attempt.
+            - One retry on 502/503/504 or connection errors, with a short backoff.
+
+        Connection:
+            - Uses the pooled session, so warm calls skip the TCP/TLS handshake.
+
+        Short-circuit:
+            - Usernames outside [A-Za-z0-9_]{1,16} are rejected without a request.
+
+        Caching:
+            - Definitive answers (200 found, 204/404 not found) are cached per
+              lowercased username for MOJANG_CACHE_TTL seconds, keeping at most
+              MOJANG_CACHE_SIZE entries. Other statuses and request errors are not
+              cached, so a Mojang outage does not stick.
 
         Notes:
             - This is a best-effort validation and may fail if Mojang's API
               is temporarily unavailable.
         """
+        # Names Mojang could never have issued don't need a round trip
+        if _MINECRAFT_USERNAME_RE.fullmatch(username) is None:
+            return False
+
+        # Minecraft usernames are case-insensitive
+        key = username.lower()
+        now = time.monotonic()
+        with self._mojang_cache_lock:
+            cached = self._mojang_cache.get(key)
+        if cached is not None and now - cached[1] < self.MOJANG_CACHE_TTL:
+            return cached[0]
+
         try:
-            resp = requests.get(
+            resp = self._http.get(
                 f"https://api.mojang.com/users/profiles/minecraft/{username}",
-                timeout=5.0,
+                timeout=(2.0, 3.0),
             )
-            return resp.status_code == 200
-        except requests.RequestException as e:
+            if resp.status_code not in (200, 204, 404):
+                return False
+
+            is_valid = resp.status_code == 200
+            with self._mojang_cache_lock:
+                # Re-insert so the entry moves to the newest end
+                self._mojang_cache.pop(key, None)
+                if len(self._mojang_cache) >= self.MOJANG_CACHE_SIZE:
+                    del self._mojang_cache[next(iter(self._mojang_cache))]
+                self._mojang_cache[key] = (is_valid, now)
+            return is_valid
+        except self._request_exception as e:
             logger.error("Error validating Minecraft user %s: %s", username, e)
             return False
 
@@ -174,33 +427,78 @@ class Walter:
 
         Side Effects:
             - Sends '/whitelist add {player_name}' via RCON to the server.
-            - Logs the RCON response at INFO level.
+            - Logs the RCON response at DEBUG level.
 
         Notes:
-            - Assumes the RCON socket is connected and authenticated.
+            - Reuses the persistent RCON connection. If the command provably never
+              reached the server (the connection was already closed, e.g. after a
+              server restart, or the send failed), reconnects and sends it once more.
+            - A failure after the command was sent (EOF, reset, read timeout) is not
+              retried: the server may have run it, and a resend would answer
+              "already whitelisted" and leave the token unused. The connection is
+              reopened for the next request and the error is raised.
+            - Callers must hold self._lock.
+
+        Raises:
+            RuntimeError: If Walter started shutting down while the command was
+                in flight; the connection is not reopened.
+            OSError, MCRconException: If the command failed after it was sent, or
+                could not be sent on a fresh connection either.
         """
-        response = self.rcon_socket.command(f"/whitelist add {player_name}")
-        logger.info("(RCON) %s", response)
+        command = f"/whitelist add {player_name}"
+        try:
+            response = self.rcon_socket.command(command)
+        except _RconCommandNotSent as e:
+            if self._closing:
+                raise RuntimeError("Walter is shutting down") from e
+            logger.info("RCON connection lost (%s); reconnecting", e)
+            self.__reconnect_rcon()
+            response = self.rcon_socket.command(command)
+        except (OSError, self._rcon_exception) as e:
+            logger.error("RCON command failed after sending, not retrying: %s", e)
+            if not self._closing:
+                try:
+                    self.__reconnect_rcon()
+                except (OSError, self._rcon_exception) as reconnect_error:
+                    # The next command finds the client disconnected and retries
+                    logger.error("Could not reconnect RCON: %s", reconnect_error)
+            raise
+        logger.debug("(RCON) %s", response)
 
         if response == "Player is already whitelisted":
             return WalterStatus.ALREADY_WHITELISTED
         return WalterStatus.OK
 
+    def __reconnect_rcon(self):
+        """
+        Replace the RCON connection with a fresh one.
+
+        Notes:
+            - Callers must hold self._lock.
+        """
+        try:
+            self.rcon_socket.disconnect()
+        except (OSError, self._rcon_exception):
+            pass  # The socket is already unusable
+        self.rcon_socket.connect()
+
     def add_to_whitelist(
-        self, discord_username: str, player_name: str
+        self, discord_user_id: int, discord_username: str, player_name: str
     ) -> WalterStatus:
         """
         Add a Minecraft player to the whitelist, enforcing a one-token-per-Discord-user limit.
 
         Workflow:
-            1. Check if the Discord user has already used their whitelist token by querying the database.
+            1. Check if the Discord user has already used their whitelist token.
             2. Validate the Minecraft username via Mojang's API.
             3. Attempt to add the player to the server's whitelist via RCON.
             4. If the player is successfully added, record the Discord user in the database
                to mark their token as used.
 
         Parameters:
-            discord_username (str): The invoking Discord user's name (or identifier).
+            discord_user_id (int): The invoking Discord user's ID; tokens are keyed on it.
+            discord_username (str): The invoking Discord user's name, only checked
+                against tokens recorded before the switch to user IDs.
             player_name (str): The Minecraft username to add to the whitelist.
 
         Returns:
@@ -210,53 +508,212 @@ class Walter:
                 - ALREADY_WHITELISTED: The player is already on the whitelist.
                 - OK: Successfully added to whitelist and user recorded in database.
 
+        Raises:
+            RuntimeError: If Walter is shutting down.
+
         Side Effects:
             - Sends an RCON command to the Minecraft server.
-            - Writes to the Discord user database if the operation is successful.
+            - Records the Discord user if the operation is successful; the row is
+              written to the database within Walter.FLUSH_INTERVAL seconds.
+
+        Notes:
+            - Mojang validation runs outside the lock so concurrent requests overlap
+              their network round trips; the token check is repeated under the lock
+              before whitelisting.
         """
-        database_query_result = self._discord_database_cursor.execute(
-            "SELECT username FROM users WHERE username=?", (discord_username,)
-        )
-        username_exists = database_query_result.fetchone() is not None
-        if username_exists:
-            return WalterStatus.DISCORD_ALREADY_USED
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("Walter is shutting down")
+            if self.__discord_user_has_used_token(discord_user_id, discord_username):
+                return WalterStatus.DISCORD_ALREADY_USED
 
         minecraft_username_is_valid = self.__check_minecraft_user_is_valid(player_name)
         if not minecraft_username_is_valid:
             return WalterStatus.MINECRAFT_USER_NOT_VALID
 
-        add_to_whitelist_response = self.__add_player_to_whitelist(player_name)
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("Walter is shutting down")
+            # A concurrent request from the same user may have finished meanwhile
+            if self.__discord_user_has_used_token(discord_user_id, discord_username):
+                return WalterStatus.DISCORD_ALREADY_USED
+
+            add_to_whitelist_response = self.__add_player_to_whitelist(player_name)
 
-        if add_to_whitelist_response is WalterStatus.ALREADY_WHITELISTED:
-            return add_to_whitelist_response
+            if add_to_whitelist_response is WalterStatus.ALREADY_WHITELISTED:
+                return add_to_whitelist_response
 
-        self.__write_to_username_database(discord_username)
+            self.__write_to_username_database(discord_user_id)
 
         return add_to_whitelist_response
 
-    def __write_to_username_database(self, discord_username: str):
+    def __discord_user_has_used_token(
+        self, discord_user_id: int, discord_username: str
+    ) -> bool:
+        """
+        Check whether a Discord user has already consumed their whitelist token.
+
+        Parameters:
+            discord_user_id (int): The Discord user ID to look up.
+            discord_username (str): The Discord username to look up among legacy,
+                username-keyed records.
+
+        Returns:
+            bool: True if the user is recorded in the database.
+
+        Notes:
+            - Answered from the in-memory sets loaded at startup and kept in sync
+              by __write_to_username_database(), including rows not yet flushed.
+            - Callers must hold self._lock.
         """
-        Records a Discord user in the database to mark their whitelist token as used.
+        return (
+            discord_user_id in self._used_discord_user_ids
+            or discord_username in self._legacy_used_discord_usernames
+        )
+
+    def __write_to_username_database(self, discord_user_id: int):
+        """
+        Records a Discord user as having used their whitelist token.
 
         Parameters:
-            discord_username (str): The Discord username to record.
+            discord_user_id (int): The Discord user ID to record.
 
         Side Effects:
-            - Inserts a new row into the 'users' table with the username, a token count
-              (currently hardcoded to 0), and the creation timestamp.
-            - Commits the transaction to the database.
+            - Adds the user ID to the in-memory set of used tokens immediately.
+            - Buffers a row for the 'users' table with the user ID and a token count
+              (currently hardcoded to 0); SQLite fills in the creation timestamp.
+            - Schedules a flush in FLUSH_INTERVAL seconds if none is pending, so a
+              burst of adds shares one transaction and one commit.
+
+        Notes:
+            - Once Walter is shutting down the final flush has already run, so the
+              user is logged as not saved instead.
+            - Callers must hold self._lock.
+        """
+        if self._closing:
+            logger.error("Could not save %s to database before exiting", discord_user_id)
+            return
+
+        self._pending_users.append((discord_user_id, 0))
+        self._used_discord_user_ids.add(discord_user_id)
+        self.__schedule_flush()
+
+    def __schedule_flush(self, delay: float = None):
+        """
+        Start the flush timer if none is pending.
+
+        Parameters:
+            delay (float): Seconds until the flush; defaults to FLUSH_INTERVAL.
+
+        Notes:
+            - The timer is a daemon thread so a failing flush can't keep the process
+              alive; flush() does the final write on a normal exit.
+            - Does nothing once Walter is shutting down; _signal_close() does the
+              final flush.
+            - Callers must hold self._lock.
+        """
+        if self._flush_timer is None and not self._closing:
+            self._flush_timer = threading.Timer(
+                self.FLUSH_INTERVAL if delay is None else delay, self._flush_timer_fired
+            )
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_timer_fired(self):
+        """Timer callback; flushes buffered inserts under the lock."""
+        with self._lock:
+            if self._closing:
+                return  # The database is closed; _signal_close() did the final flush
+            self.__flush_pending_users()
+
+    def flush(self):
+        """
+        Write buffered users to the database now, for use on a normal exit.
+
+        Notes:
+            - Waits at most SHUTDOWN_LOCK_TIMEOUT seconds for an in-flight request.
+            - Does nothing once Walter is shutting down; _signal_close() did the
+              final flush.
+        """
+        if not self._lock.acquire(timeout=self.SHUTDOWN_LOCK_TIMEOUT):
+            logger.error("Timed out waiting for in-flight requests; buffered users not saved")
+            return
+        try:
+            if self._closing:
+                return
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self.__flush_pending_users(retry=False)
+        finally:
+            self._lock.release()
+
+    def __flush_pending_users(self, retry: bool = True):
+        """
+        Write all buffered users to the database in a single transaction.
+
+        Parameters:
+            retry (bool): Whether a locked/busy database schedules another attempt.
+                False for the final flush before exiting.
+
+        Side Effects:
+            - Inserts the buffered rows with executemany() inside one BEGIN/COMMIT.
+            - Clears the buffer and the pending flush timer.
+            - If the database is locked or busy, puts the rows back in the buffer and
+              retries up to FLUSH_MAX_RETRIES times with a doubling delay.
+            - On any other failure, or once the retries are used up, drops the rows
+              and removes their user IDs from the in-memory set of used tokens, which
+              was updated when they were queued, so it matches the database again.
 
         Raises:
             Logs ERROR on any exception encountered during the database operation.
+
+        Notes:
+            - Callers must hold self._lock.
         """
+        self._flush_timer = None
+        if not self._pending_users:
+            return
+
+        pending_users, self._pending_users = self._pending_users, []
+        user_ids = ", ".join(str(row[0]) for row in pending_users)
+        connection = self._discord_database_connection
         try:
-            current_time = datetime.now().isoformat()
-            self._discord_database_cursor.execute(
-                "INSERT INTO users VALUES (?, ?, ?)",
-                (discord_username, 0, current_time),
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT INTO users(user_id, tokens) VALUES (?, ?)", pending_users
             )
-            self._discord_database_connection.commit()
-            logger.info("Added %s to database", discord_username)
+            connection.execute("COMMIT")
+            self._flush_retries = 0
+            logger.info("Added %s to database", user_ids)
 
         except Exception as e:
-            logger.error("Error adding %s to username database: %s", discord_username, e)
+            try:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass  # Nothing was committed either way
+
+            transient = isinstance(e, sqlite3.OperationalError) and (
+                "locked" in str(e) or "busy" in str(e)
+            )
+            if (
+                retry
+                and transient
+                and not self._closing
+                and self._flush_retries < self.FLUSH_MAX_RETRIES
+            ):
+                self._flush_retries += 1
+                logger.error(
+                    "Error adding %s to username database: %s; retrying", user_ids, e
+                )
+                self._pending_users[:0] = pending_users
+                self.__schedule_flush(self.FLUSH_INTERVAL * 2 ** self._flush_retries)
+                return
+
+            self._flush_retries = 0
+            logger.error(
+                "Error adding %s to username database: %s; their tokens are not recorded",
+                user_ids,
+                e,
+            )
+            self._used_discord_user_ids.difference_update(row[0] for row in pending_users)